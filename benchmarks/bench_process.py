@@ -0,0 +1,60 @@
+"""
+Benchmark the processing of TCS frames.
+
+The quarantine of malformed lines shall not slow down the processing of clean frames. This
+script times `process_telemetry()` for a clean frame against the same loop without any error
+handling, and for a frame with one malformed line, which takes the slow path.
+
+Run it from the root of the repository with the package installed or on the path:
+
+    $ PYTHONPATH=. python benchmarks/bench_process.py
+"""
+import logging
+import timeit
+
+import tcsstamp.process as process
+from tcsstamp.process import convert_date, extract_value, housekeeping
+
+NUMBER = 2000
+REPEAT = 5
+NR_LINES = 60
+
+lines = [
+    f"2021/01/10 16:12:01.{idx:03d} UTC\tch1_tav_{idx}\t{idx}.5 ºC" for idx in range(NR_LINES)
+]
+clean_frame = '\r\n'.join(lines) + '\r\n\x03'
+bad_frame = '\r\n'.join(lines[:30] + ["malformed line"] + lines[30:]) + '\r\n\x03'
+
+
+def process_unchecked(data: str):
+    """The processing loop of process_telemetry() without any error handling."""
+    data = data.split('\x03')
+    data = [x for x in data if x]
+    data = data[0].split('\r\n')
+    data = [x.split('\t') for x in data if x]
+
+    for x in data:
+        date = convert_date(x[0])
+        name = x[1]
+        value = extract_value(x[1], x[2])
+        housekeeping[name] = [date, name, value]
+
+    return housekeeping
+
+
+def bench(name: str, func, frame: str):
+    best = min(timeit.repeat(lambda: func(frame), number=NUMBER, repeat=REPEAT))
+    print(f"{name:<40} {best / NUMBER * 1e6:>10.1f} µs/frame")
+
+
+def main():
+    logging.disable(logging.WARNING)
+
+    print(f"{NR_LINES} lines per frame, best of {REPEAT} x {NUMBER} frames")
+    bench("clean frame, no error handling", process_unchecked, clean_frame)
+    bench("clean frame, process_telemetry", process.process_telemetry, clean_frame)
+    bench("one malformed line, process_telemetry", process.process_telemetry, bad_frame)
+
+
+if __name__ == "__main__":
+    main()
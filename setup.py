@@ -125,7 +125,8 @@ setup(
     ],
     packages=["tcsstamp"],
     extras_require={
-        "fancy output": ["rich"]
+        "fancy output": ["rich"],
+        "zstd": ["zstandard"],
     },
     entry_points={
         "console_scripts": [
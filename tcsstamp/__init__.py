@@ -7,4 +7,6 @@ from .__version__ import __version__
 from .sock_if import TCSInterface
 from .sock_if import STAMPInterface
 from .console import print_table
+from .scheduler import OutputScheduler
+from .archive import ArchiveWriter
 from .process import timestamp_key
@@ -7,14 +7,23 @@ a format that is understood by STAMP.
 """
 
 import argparse
+import cProfile
 import datetime
 import operator
+import queue
 import sys
-import time
+import threading
 
 import tcsstamp
+import tcsstamp.archive
 import tcsstamp.process
-from tcsstamp import STAMPInterface, TCSInterface, print_table
+import tcsstamp.profiling
+from tcsstamp import ArchiveWriter, OutputScheduler, STAMPInterface, TCSInterface, print_table
+
+# The maximum time the main loop waits for a frame. On Windows, a blocking wait is not
+# interrupted by CTRL-C, so the main loop shall wake up regularly.
+
+MAX_WAIT = 1.0
 
 
 class BooleanAction(argparse.Action):
@@ -70,8 +79,18 @@ def parse_arguments():
     )
     parser.add_argument(
         "--rate", "-r",
-        type=int, default=0,
-        help="The outgoing telemetry rate to STAMP [seconds].",
+        type=float, default=0,
+        help="The outgoing telemetry rate to STAMP [seconds], fractional values are allowed.",
+    )
+    parser.add_argument(
+        "--align",
+        action="store_true",
+        help="Align the outgoing telemetry to the wall-clock, e.g. every full 10s for --rate 10.",
+    )
+    parser.add_argument(
+        "--on-change", dest='on_change',
+        action="store_true",
+        help="Send telemetry as soon as it is received, but not more often than --rate.",
     )
     parser.add_argument(
         "--clear", "--no-clear", dest='clear',
@@ -83,11 +102,65 @@ def parse_arguments():
         action="store_true",
         help="Sort the HK table by name instead of time.",
     )
+    parser.add_argument(
+        "--archive",
+        type=str,
+        help="Archive the telemetry sent to STAMP in daily compressed files in this folder.",
+    )
+    parser.add_argument(
+        "--archive-raw", dest='archive_raw',
+        action="store_true",
+        help="Also archive the raw telemetry that is received from the TCS EGSE.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=list(tcsstamp.archive.COMPRESSIONS), default='gzip',
+        help="The compression used for the archive files.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="Run the main loop under cProfile and write the statistics to this file (pstats).",
+    )
+    parser.add_argument(
+        "--profile-duration", dest='profile_duration',
+        type=float,
+        help="Stop after this number of seconds, use together with --profile or --timers.",
+    )
+    parser.add_argument(
+        "--profile-frames", dest='profile_frames',
+        type=int,
+        help="Stop after this number of TCS frames, use together with --profile or --timers.",
+    )
+    parser.add_argument(
+        "--timers",
+        action="store_true",
+        help="Count the calls and time spent in the conversion functions and print them at exit.",
+    )
     parser.version = f"version {tcsstamp.__version__}"
     arguments = parser.parse_args()
     return arguments, parser
 
 
+def read_frames(tcs: TCSInterface, frames: queue.Queue):
+    """
+    Read the Telemetry from the TCS EGSE and put the frames on the queue. This function is
+    executed in a separate thread such that reading is decoupled from sending to STAMP.
+    Any exception is also put on the queue, it will be raised again in the main thread.
+
+    The read returns an empty frame only when the TCS EGSE closed the connection, reading
+    is then stopped and a ConnectionError is put on the queue.
+    """
+    try:
+        while True:
+            frame = tcs.read()
+            if not frame:
+                raise ConnectionError(f"{tcs.device_name}: Connection closed by {tcs.hostname}.")
+            frames.put(frame)
+    except Exception as exc:
+        frames.put(exc)
+
+
 def main():
     args, parser = parse_arguments()
 
@@ -100,9 +173,36 @@ def main():
 
     tcsstamp.process.time_fraction = args.fractional_time
     verbose = args.verbose
-    rate = args.rate
     rich = args.rich
 
+    if args.rate < 0:
+        print(f"{parser.prog}: error: The --rate argument shall be a positive number of seconds.")
+        sys.exit(0)
+
+    if (args.profile_duration or args.profile_frames) and not (args.profile or args.timers):
+        print(f"{parser.prog}: error: The --profile-duration and --profile-frames arguments "
+              f"require the --profile or --timers argument.")
+        sys.exit(0)
+
+    if args.archive_raw and not args.archive:
+        print(f"{parser.prog}: error: The --archive-raw argument requires the --archive argument.")
+        sys.exit(0)
+
+    if args.archive:
+        try:
+            archive = ArchiveWriter(args.archive, "stamp", args.compression)
+            if args.archive_raw:
+                archive_raw = ArchiveWriter(args.archive, "tcs", args.compression)
+            else:
+                archive_raw = None
+        except ModuleNotFoundError as exc:
+            print(f"{parser.prog}: error: {exc}")
+            sys.exit(0)
+        archive.start()
+        archive_raw and archive_raw.start()
+    else:
+        archive = archive_raw = None
+
     if args.stamp:
         stamp_hostname, stamp_port = args.stamp.split(':')
         stamp = STAMPInterface(stamp_hostname, int(stamp_port))
@@ -114,46 +214,104 @@ def main():
     tcs = TCSInterface(tcs_hostname, int(tcs_port))
     tcs.connect()
 
-    start = time.perf_counter()
+    # Profiling must be set up before the sort key is selected, since that is a function
+    # from the process module that might be replaced by a timed version.
+
+    if args.timers:
+        tcsstamp.profiling.instrument()
+
+    scheduler = OutputScheduler(args.rate, align=args.align, on_change=args.on_change)
+
+    # The queue is bounded, when the main thread can not keep up, the reader thread blocks
+    # and the TCS EGSE is throttled by the TCP flow control instead of memory growing.
+
+    frames = queue.Queue(maxsize=100)
+    threading.Thread(target=read_frames, args=(tcs, frames), daemon=True).start()
+
+    if args.profile or args.timers:
+        stop = tcsstamp.profiling.stop_after(args.profile_duration, args.profile_frames)
+    else:
+        stop = None
+
+    tm_data = tcsstamp.process.housekeeping
 
     if args.sort_by_name:
         sort_key = tcsstamp.process.name_key
     else:
         sort_key = tcsstamp.process.timestamp_key
 
-    while True:
-        try:
-            # Read the Telemetry from the TCS EGSE
-
-            tm_data = tcs.read()
-            tm_data = tcsstamp.process.process_telemetry(tm_data)
-            verbose > 2 and print(f"{tm_data=}")
-            verbose > 0 and print(
-                f"{datetime.datetime.now().strftime('%Y/%m/%d %H:%M:%S.%f')[:-3]} "
-                f"nr of telemetry values = {len(tm_data)}"
-            )
-
-            # Write the converted data to the STAMP or stdout
-
-            if time.perf_counter() - start > rate:
-                sorted_tm_data = sorted(tm_data.values(), key=sort_key)
-                for entry in sorted_tm_data:
-                    line = f"{entry[0]}\t{entry[1]}\t0000\t{entry[2]}\n"
+    sort = tcsstamp.profiling.timed(sorted, "sorted") if args.timers else sorted
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Make sure the profile is written, the archive is complete, and the connections are closed,
+    # also when the main loop is terminated by an exception, e.g. when STAMP closed the connection.
+
+    try:
+        while True:
+            try:
+                # Wait for Telemetry from the TCS EGSE, but not longer than the next output deadline
+
+                timeout = scheduler.timeout()
+                timeout = MAX_WAIT if timeout is None else min(timeout, MAX_WAIT)
+                try:
+                    frame = frames.get(timeout=timeout)
+                except queue.Empty:
+                    pass
+                else:
+                    if isinstance(frame, Exception):
+                        raise frame
+                    archive_raw and archive_raw.write(bytes(frame, 'ISO-8859-1'))
+                    tm_data = tcsstamp.process.process_telemetry(frame)
+                    scheduler.notify()
+                    verbose > 2 and print(f"{tm_data=}")
+                    verbose > 0 and print(
+                        f"{datetime.datetime.now().strftime('%Y/%m/%d %H:%M:%S.%f')[:-3]} "
+                        f"nr of telemetry values = {len(tm_data)}"
+                    )
+                    verbose > 1 and tcsstamp.process.parse_errors and print(
+                        f"nr of quarantined lines = {sum(tcsstamp.process.parse_errors.values())}, "
+                        f"{dict(tcsstamp.process.parse_errors)}"
+                    )
+
+                # Write the converted data to the STAMP or stdout
+
+                if scheduler.is_due():
+                    sorted_tm_data = sort(tm_data.values(), key=sort_key)
+                    lines = ''.join(
+                        f"{entry[0]}\t{entry[1]}\t0000\t{entry[2]}\n" for entry in sorted_tm_data
+                    )
+                    archive and lines and archive.write(bytes(lines, 'utf-8'))
                     if stamp:
-                        stamp.write(bytes(line, 'utf-8'))
+                        stamp.write(bytes(lines, 'utf-8'))
                     elif not rich:
-                        print(line, end='')
-                if not stamp and rich:
-                    print_table(sorted_tm_data)
-                if args.clear:
-                    tcsstamp.process.housekeeping.clear()
-                start = time.perf_counter()
-
-        except KeyboardInterrupt:
-            break
-
-    tcs.disconnect()
-    stamp and stamp.disconnect()
+                        print(lines, end='')
+                    if not stamp and rich and sorted_tm_data:
+                        print_table(sorted_tm_data)
+                    if args.clear:
+                        tcsstamp.process.housekeeping.clear()
+                    scheduler.sent()
+
+                if stop and stop.is_set():
+                    break
+
+            except KeyboardInterrupt:
+                break
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile statistics written to {args.profile}")
+
+        if args.timers:
+            print(tcsstamp.profiling.report())
+
+        archive and archive.close()
+        archive_raw and archive_raw.close()
+        tcs.disconnect()
+        stamp and stamp.disconnect()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,270 @@
+"""
+Archive the telemetry in daily rotated, compressed files.
+
+The data is compressed in independent blocks, each block is a complete gzip member or zstd frame,
+such that the archive can still be decompressed as a whole with the standard tools. For every
+block, a line is appended to an index file next to the archive. That line contains the offset
+and length of the compressed block, the size and CRC32 checksum of the uncompressed data, and
+the time of the first and last data in the block. This allows to decompress only the blocks
+that cover a given time window.
+
+Compression and disk I/O are done in a background thread, writing to the archive only puts the
+data on a queue and never blocks.
+"""
+import datetime
+import gzip
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+logger = logging.getLogger("TCS-STAMP.archive")
+
+COMPRESSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+class Block(NamedTuple):
+    """An entry in the index file of an archive."""
+    offset: int
+    length: int
+    size: int
+    crc32: int
+    first: float
+    last: float
+
+
+def get_compressor(compression: str):
+    """Returns the function that compresses a block for the given compression."""
+    if compression == 'gzip':
+        return gzip.compress
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ModuleNotFoundError(
+                "The 'zstandard' module must be installed for zstd compression."
+            )
+        return zstandard.ZstdCompressor().compress
+    raise ValueError(f"Unknown compression '{compression}', use one of {list(COMPRESSIONS)}.")
+
+
+def get_decompressor(path: Path):
+    """Returns the function that decompresses a block of the given archive file."""
+    if path.suffix == '.gz':
+        return gzip.decompress
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise ModuleNotFoundError(
+                "The 'zstandard' module must be installed for zstd compression."
+            )
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown compression for archive '{path}'.")
+
+
+class ArchiveWriter:
+    """
+    Writes data to daily rotated, compressed archive files in a background thread.
+
+    The archive files are named '<prefix>_YYYYMMDD.txt.gz' (or '.zst'), the date is the UTC
+    date on which the data was written. The index file has the same name with '.idx' appended.
+
+    Args:
+        directory (str): the folder where the archive files are written.
+        prefix (str): the first part of the archive filenames, e.g. 'stamp' or 'tcs'.
+        compression (str): either 'gzip' or 'zstd'.
+        block_size (int): a block is compressed when it contains this many bytes.
+        block_interval (float): a block is compressed when it is this many seconds old.
+    """
+
+    def __init__(self, directory: str, prefix: str, compression: str = 'gzip',
+                 block_size: int = 1024 * 1024, block_interval: float = 60.0):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.compress = get_compressor(compression)
+        self.suffix = COMPRESSIONS[compression]
+        self.block_size = block_size
+        self.block_interval = block_interval
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"archive-{prefix}", daemon=True)
+
+        self._day = None
+        self._archive = None
+        self._index = None
+        self._buffer = []
+        self._buffer_size = 0
+        self._first = self._last = 0.0
+        self._deadline = None
+        self._stopped = False
+
+    def start(self):
+        """Create the archive folder and start the background thread."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+
+    def write(self, data: bytes):
+        """
+        Put the data on the queue for archiving, this never blocks. When the background thread
+        has stopped unexpectedly, the data is dropped and an error is logged once.
+        """
+        if self._thread.ident is not None and not self._thread.is_alive():
+            if not self._stopped:
+                self._stopped = True
+                logger.error(f"The archive thread for '{self.prefix}' has stopped, "
+                             f"no more data will be archived to {self.directory}.")
+            return
+        self._queue.put((time.time(), data))
+
+    def close(self):
+        """Archive all the data that is still in the queue and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            if self._deadline is None:
+                timeout = None
+            else:
+                timeout = max(0.0, self._deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush()
+                continue
+
+            if item is None:
+                self._flush()
+                self._close_files()
+                break
+
+            timestamp, data = item
+            day = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+            day = day.strftime("%Y%m%d")
+            if day != self._day:
+                self._flush()
+                self._close_files()
+                self._day = day
+
+            if not self._buffer:
+                self._first = timestamp
+                self._deadline = time.monotonic() + self.block_interval
+            self._buffer.append(data)
+            self._buffer_size += len(data)
+            self._last = timestamp
+
+            if self._buffer_size >= self.block_size:
+                self._flush()
+
+    def _flush(self):
+        """Compress the buffered data as one block and append it to the archive."""
+        if not self._buffer:
+            return
+
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        self._deadline = None
+
+        try:
+            if self._archive is None:
+                filename = self.directory / f"{self.prefix}_{self._day}.txt{self.suffix}"
+                self._archive = open(filename, 'ab')
+                self._index = open(f"{filename}.idx", 'a')
+
+            block = self.compress(data)
+            offset = self._archive.tell()
+            self._archive.write(block)
+            self._archive.flush()
+            self._index.write(
+                f"{offset}\t{len(block)}\t{len(data)}\t{zlib.crc32(data):08x}\t"
+                f"{self._first:.3f}\t{self._last:.3f}\n"
+            )
+            self._index.flush()
+        except Exception as exc:
+            logger.error(f"Could not archive {len(data)} bytes to {self.directory}: {exc}")
+
+    def _close_files(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._index.close()
+            self._archive = self._index = None
+
+
+def read_index(path: str) -> List[Block]:
+    """
+    Read the index of the given archive file.
+
+    Args:
+        path (str): the archive file, not the index file.
+
+    Returns:
+        A list with the blocks in the archive.
+    """
+    blocks = []
+    with open(f"{path}.idx") as fd:
+        for line in fd:
+            offset, length, size, crc32, first, last = line.split('\t')
+            blocks.append(Block(
+                int(offset), int(length), int(size), int(crc32, 16), float(first), float(last)
+            ))
+    return blocks
+
+
+def iter_blocks(path: str, start: Optional[float] = None,
+                end: Optional[float] = None) -> Iterator[bytes]:
+    """
+    Decompress the blocks of the archive that contain data from the given time window.
+
+    The time window is applied per block, i.e. the first and last block can contain data that
+    was written before `start` or after `end`.
+
+    Args:
+        path (str): the archive file.
+        start (float): the start of the time window [seconds since epoch], None for no limit.
+        end (float): the end of the time window [seconds since epoch], None for no limit.
+
+    Returns:
+        An iterator over the uncompressed blocks.
+
+    Raises:
+        ValueError: when the checksum or size of a block doesn't match the index.
+    """
+    path = Path(path)
+    decompress = get_decompressor(path)
+
+    with open(path, 'rb') as fd:
+        for block in read_index(path):
+            if start is not None and block.last < start:
+                continue
+            if end is not None and block.first > end:
+                break
+            fd.seek(block.offset, os.SEEK_SET)
+            try:
+                data = decompress(fd.read(block.length))
+            except Exception as exc:
+                raise ValueError(
+                    f"Corrupt block at offset {block.offset} in archive '{path}'."
+                ) from exc
+            if len(data) != block.size or zlib.crc32(data) != block.crc32:
+                raise ValueError(f"Corrupt block at offset {block.offset} in archive '{path}'.")
+            yield data
+
+
+def iter_lines(path: str, start: Optional[float] = None,
+               end: Optional[float] = None) -> Iterator[bytes]:
+    """
+    Iterate over the lines in the blocks of the archive that contain data from the given time
+    window. See `iter_blocks()` for a description of the arguments.
+    """
+    for data in iter_blocks(path, start, end):
+        yield from data.splitlines(keepends=True)
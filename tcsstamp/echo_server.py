@@ -1,41 +1,130 @@
+"""
+A stand-in for STAMP that accepts the housekeeping stream from one or more bridges.
+
+The records are reassembled from the stream, validated against the STAMP format and counted.
+Statistics are printed periodically. The records are only printed when requested, because
+printing every record to the console is much slower than the bridge itself.
+"""
 import argparse
 import logging
+import re
+import selectors
 import socket
+import time
+from typing import Optional, Set
 
 HOST = '127.0.0.1'  # Standard loopback interface address (localhost)
 PORT = 4444         # Port to listen on (non-privileged ports are > 1023)
 
 logger = logging.getLogger("echo server")
 
+# A STAMP record: "DD.MM.YYYY HH:MM:SS[.fff]\tname\t0000\tvalue"
 
-def read(conn) -> str:
-    """
-    Read the telemetry from the socket until the EOT ('\x03') is received.
+record_pattern = re.compile(rb'\d\d\.\d\d\.\d{4} \d\d:\d\d:\d\d(?:\.\d{3})?\t[^\t]+\t0000\t[^\t]*')
 
-    Returns:
-        A bytes object containing the received telemetry.
-    """
-    idx, n_total = 0, 0
-    buf_size = 1024 * 4
-    response = bytes()
 
-    try:
-        for idx in range(100):
-            # time.sleep(0.01)  # Give the device time to fill the buffer
-            data = conn.recv(buf_size)
-            n = len(data)
-            n_total += n
-            response += data
-            # if data.endswith(b'\n'):
-            if n < buf_size:
-                break
-    except socket.timeout as e_timeout:
-        logger.warning(f"Socket timeout error from {e_timeout}")
-        return ""
+class Statistics:
+    """Counters for the records that were received since the last report."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.n_bytes = 0
+        self.n_records = 0
+        self.n_invalid = 0
+        self.n_out_of_order = 0
+        self.n_missing = 0
+        self.n_batches = 0
+        self.n_latency = 0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def report(self) -> str:
+        """Returns a one line report of the statistics."""
+        elapsed = time.monotonic() - self.start
+        mean_latency = self.total_latency / self.n_latency if self.n_latency else 0.0
+        return (
+            f"{self.n_records / elapsed:.1f} records/s, {self.n_bytes / elapsed:.1f} bytes/s, "
+            f"{self.n_batches} batches, inter-batch latency mean={mean_latency:.3f}s "
+            f"max={self.max_latency:.3f}s, invalid={self.n_invalid}, "
+            f"out-of-order={self.n_out_of_order}, missing={self.n_missing}"
+        )
 
-    logger.debug(f"Total number of bytes received is {n_total}, idx={idx}")
 
-    return response.decode(encoding='ISO-8859–1')
+class Connection:
+    """
+    Reassembles the newline delimited records that are received on one connection.
+
+    A batch is a group of records that are received without a pause longer than `batch_gap`
+    seconds. A parameter is missing when it is expected, but not part of the batch. Missing
+    parameters are only counted when the expected parameters are given, because the bridge
+    by default only sends the parameters that changed since the previous batch. A record is
+    out-of-order when its timestamp is earlier than the previous record for the same parameter.
+    """
+
+    def __init__(self, addr, batch_gap: float, expected: Optional[Set[bytes]] = None):
+        self.addr = addr
+        self.batch_gap = batch_gap
+        self.buffer = b''
+        self.last_received = None
+        self.batch_start = None
+        self.batch = set()
+        self.expected = expected
+        self.timestamps = {}
+
+    def close_batch(self, stats: Statistics):
+        """Count the missing parameters of the current batch and start a new batch."""
+        if not self.batch:
+            return
+        if self.expected is not None:
+            stats.n_missing += len(self.expected - self.batch)
+        self.batch = set()
+
+    def close(self, stats: Statistics):
+        """Close the current batch, an unterminated record at the end is counted as invalid."""
+        self.close_batch(stats)
+        if self.buffer:
+            stats.n_records += 1
+            stats.n_invalid += 1
+            self.buffer = b''
+
+    def receive(self, data: bytes, stats: Statistics) -> bytes:
+        """
+        Process the received data and returns the complete records, including the
+        terminating newline. An incomplete record at the end is kept until the next call.
+        """
+        now = time.monotonic()
+
+        if self.last_received is None or now - self.last_received > self.batch_gap:
+            self.close_batch(stats)
+            if self.batch_start is not None:
+                latency = now - self.batch_start
+                stats.total_latency += latency
+                stats.n_latency += 1
+                stats.max_latency = max(stats.max_latency, latency)
+            self.batch_start = now
+            stats.n_batches += 1
+        self.last_received = now
+
+        stats.n_bytes += len(data)
+
+        data = self.buffer + data
+        idx = data.rfind(b'\n') + 1
+        records, self.buffer = data[:idx], data[idx:]
+
+        for record in records.split(b'\n')[:-1]:
+            stats.n_records += 1
+            if not record_pattern.fullmatch(record):
+                stats.n_invalid += 1
+                continue
+            date, name, _ = record.split(b'\t', 2)
+            # Make the timestamp sortable as YYYYMMDD HH:MM:SS[.fff]
+            timestamp = date[6:10] + date[3:5] + date[:2] + date[10:]
+            if timestamp < self.timestamps.get(name, b''):
+                stats.n_out_of_order += 1
+            self.timestamps[name] = timestamp
+            self.batch.add(name)
+
+        return records
 
 
 def parse_arguments():
@@ -45,7 +134,8 @@ def parse_arguments():
 
     parser = argparse.ArgumentParser(
         prog="echo_server",
-        description="Listen on the given port [default=4444] and echo stream to stdout.",
+        description="Listen on the given port [default=4444], verify the STAMP records that are "
+                    "received and report statistics.",
     )
     parser.add_argument(
         "--port", "-p",
@@ -53,6 +143,32 @@ def parse_arguments():
         default=PORT,
         help="The TCP port to listen for incoming connections.",
     )
+    parser.add_argument(
+        "--echo",
+        action="store_true",
+        help="Echo the received records to stdout.",
+    )
+    parser.add_argument(
+        "--output", "-o",
+        type=str,
+        help="Append the received records to the given file.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float, default=10.0,
+        help="The interval for reporting the statistics [seconds].",
+    )
+    parser.add_argument(
+        "--batch-gap", dest='batch_gap',
+        type=float, default=0.1,
+        help="A pause longer than this starts a new batch of records [seconds].",
+    )
+    parser.add_argument(
+        "--expect",
+        type=str,
+        help="A comma separated list of parameter names that are expected in each batch, "
+             "missing parameters are only counted when this option is given.",
+    )
 
     arguments = parser.parse_args()
     return arguments
@@ -62,23 +178,68 @@ def main():
 
     args = parse_arguments()
     port = args.port
+    expected = set(args.expect.encode().split(b',')) if args.expect else None
 
     print(f"Listening on {HOST}:{port}")
 
+    output = open(args.output, 'ab', buffering=1024 * 1024) if args.output else None
+    stats = Statistics()
+    sel = selectors.DefaultSelector()
+
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind((HOST, port))
         s.listen()
-        conn, addr = s.accept()
-        with conn:
-            print('Accepted connection from', addr)
-            try:
-                while True:
-                    data = read(conn)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, None)
+
+        next_report = time.monotonic() + args.interval
+
+        try:
+            while True:
+                for key, _ in sel.select(timeout=max(0.0, next_report - time.monotonic())):
+                    if key.data is None:
+                        conn, addr = key.fileobj.accept()
+                        print('Accepted connection from', addr)
+                        conn.setblocking(False)
+                        sel.register(conn, selectors.EVENT_READ,
+                                     Connection(addr, args.batch_gap, expected))
+                        continue
+
+                    conn, connection = key.fileobj, key.data
+                    try:
+                        data = conn.recv(1024 * 64)
+                    except BlockingIOError:
+                        continue
+                    except OSError as exc:
+                        print(f'Connection error from {connection.addr}: {exc}')
+                        data = b''
                     if not data:
-                        break
-                    print(repr(data))
-            except KeyboardInterrupt:
-                print("Keyboard interrupt, closing.")
+                        print('Closed connection from', connection.addr)
+                        connection.close(stats)
+                        sel.unregister(conn)
+                        conn.close()
+                        continue
+
+                    records = connection.receive(data, stats)
+                    if output:
+                        output.write(records)
+                    if args.echo:
+                        print(records.decode(encoding='ISO-8859-1'), end='')
+
+                if time.monotonic() >= next_report:
+                    output and output.flush()
+                    stats.n_bytes and print(stats.report())
+                    stats = Statistics()
+                    next_report += args.interval
+        except KeyboardInterrupt:
+            print("Keyboard interrupt, closing.")
+        finally:
+            for key in list(sel.get_map().values()):
+                if key.data is not None:
+                    key.fileobj.close()
+            sel.close()
+            output and output.close()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,30 @@
 """Process Telemetry data."""
+import collections
 import datetime
 import logging
 import re
+import time
 from typing import Dict, List
 
 logger = logging.getLogger()
+quarantine_logger = logging.getLogger("TCS-STAMP.quarantine")
 
 housekeeping = dict()
 
+# Lines that could not be parsed are kept in a bounded side log together with the raw bytes and
+# the reason they were rejected. The error counters are never reset and count all rejected lines.
+
+QUARANTINE_SIZE = 100
+
+# Each quarantined line is logged at debug level, a warning with the error counters is logged
+# at most once per QUARANTINE_WARNING_INTERVAL seconds.
+
+QUARANTINE_WARNING_INTERVAL = 60.0
+
+quarantine = collections.deque(maxlen=QUARANTINE_SIZE)
+parse_errors = collections.Counter()
+_last_quarantine_warning = None
+
 
 def process_telemetry(data: str) -> Dict:
     """
@@ -20,6 +37,11 @@ def process_telemetry(data: str) -> Dict:
         A dictionary where the key is the housekeeping parameter name and the value is a list
         containing the timestamp, name, and value of the housekeeping parameter. Only the last
         sample in kept in the dictionary.
+
+    Note:
+        Lines that are malformed are not processed but moved to the quarantine, the other lines
+        in the same frame are still processed. The frame is first processed without any checks,
+        only when that fails, the frame is processed again line by line with validation.
     """
     global housekeeping
 
@@ -29,19 +51,72 @@ def process_telemetry(data: str) -> Dict:
         logger.warning("Format error: no new housekeeping values received.")
         return housekeeping
     data = data[0].split('\r\n')
-    data = [x.split('\t') for x in data]
+    data = [x.split('\t') for x in data if x]
 
     # We do not need to sort by timestamp since the data is already sorted by time.
     # The
     # data = sorted(data, key=operator.itemgetter(0))  # sort by date
 
+    try:
+        for x in data:
+            date = convert_date(x[0])
+            name = x[1]
+            value = extract_value(x[1], x[2])
+            housekeeping[name] = [date, name, value]
+    except (IndexError, ValueError):
+        process_lines_checked(data)
+
+    return housekeeping
+
+
+def process_lines_checked(data: List[List[str]]):
+    """
+    Process the lines of a frame one by one and quarantine the lines that are malformed.
+
+    This is the slow path of `process_telemetry()`, it is only used for frames that contain at
+    least one line that could not be parsed. Lines that were already processed before the error
+    was detected are processed again, which is harmless since only the last sample is kept.
+
+    Args:
+        data (list): the lines of the frame, each line split into its TAB separated fields.
+    """
     for x in data:
-        date = convert_date(x[0])
+        if len(x) < 3:
+            quarantine_line(x, "fields", f"expected 3 fields, got {len(x)}")
+            continue
+        try:
+            date = convert_date(x[0])
+        except ValueError as exc:
+            quarantine_line(x, "date", str(exc))
+            continue
         name = x[1]
         value = extract_value(x[1], x[2])
         housekeeping[name] = [date, name, value]
 
-    return housekeeping
+
+def quarantine_line(fields: List[str], error: str, message: str):
+    """
+    Put a malformed line in the quarantine and count the error.
+
+    Args:
+        fields (list): the line split into its TAB separated fields.
+        error (str): the kind of error, used as the key in the error counters.
+        message (str): a description of the error.
+    """
+    global _last_quarantine_warning
+
+    raw = '\t'.join(fields).encode(encoding='ISO-8859-1', errors='replace')
+    parse_errors[error] += 1
+    quarantine.append((datetime.datetime.now(), error, message, raw))
+    quarantine_logger.debug(f"Format error: line quarantined ({message}): {raw!r}")
+
+    now = time.monotonic()
+    if (_last_quarantine_warning is None
+            or now - _last_quarantine_warning >= QUARANTINE_WARNING_INTERVAL):
+        _last_quarantine_warning = now
+        quarantine_logger.warning(
+            f"Format error: malformed lines quarantined, error counters {dict(parse_errors)}"
+        )
 
 
 def convert_date(date: str):
@@ -0,0 +1,103 @@
+"""
+Profiling support for the conversion hot path.
+
+Nothing in this module is active unless requested from the command line. The timing counters
+are added by replacing the functions in the `process` module and the methods of the socket
+interfaces with timed wrappers, so when they are not requested, the hot path is not touched.
+"""
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from . import process
+from .sock_if import STAMPInterface, TCSInterface
+
+# The timing counters, the key is the name of the function, the value is a list
+# containing the number of calls and the total time spent in the function [seconds].
+
+timers: Dict[str, List] = {}
+
+
+def timed(func: Callable, name: Optional[str] = None) -> Callable:
+    """
+    Returns a wrapper around the function that counts the calls and the time spent in the
+    function. The counters are kept in the `timers` dictionary under the given name.
+    """
+    counter = timers.setdefault(name or func.__qualname__, [0, 0.0])
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+
+    return wrapper
+
+
+def instrument():
+    """
+    Add timing counters to the functions in the conversion hot path. This shall be called
+    before the main loop is started, because functions that were already looked up, e.g.
+    the sort key, are not replaced.
+    """
+    for name in ('process_telemetry', 'convert_date', 'extract_value', 'timestamp_key', 'name_key'):
+        setattr(process, name, timed(getattr(process, name)))
+
+    # Reading blocks until the next frame arrives, so most of this time is waiting for the TCS EGSE.
+
+    TCSInterface.read = timed(TCSInterface.read, "TCSInterface.read (incl. wait)")
+    STAMPInterface.write = timed(STAMPInterface.write)
+
+
+def report() -> str:
+    """Returns a table with the timing counters, sorted by the total time."""
+    lines = [f"{'function':<32} {'calls':>10} {'total [s]':>12} {'per call [µs]':>14}"]
+    for name, (calls, total) in sorted(timers.items(), key=lambda x: x[1][1], reverse=True):
+        per_call = total / calls * 1e6 if calls else 0.0
+        lines.append(f"{name:<32} {calls:>10} {total:>12.6f} {per_call:>14.1f}")
+    return '\n'.join(lines)
+
+
+def stop_after(duration: Optional[float] = None,
+               frames: Optional[int] = None) -> threading.Event:
+    """
+    Stop the main loop after the given duration or number of frames, whichever comes first.
+
+    The returned event is set when the duration has passed or when the given number of frames
+    has been processed. The main loop checks the event after the housekeeping has been sent,
+    so the last frame is also sent out. The main loop wakes up at least once per second, also
+    when no frames arrive, see `MAX_WAIT` in `__main__`.
+
+    Args:
+        duration (float): the number of seconds after which the main loop is stopped.
+        frames (int): the number of TCS frames after which the main loop is stopped.
+
+    Returns:
+        An event that is set when the main loop shall stop.
+    """
+    stop = threading.Event()
+
+    if duration:
+        timer = threading.Timer(duration, stop.set)
+        timer.daemon = True
+        timer.start()
+
+    if frames:
+        process_telemetry = process.process_telemetry
+        count = 0
+
+        @functools.wraps(process_telemetry)
+        def wrapper(data: str):
+            nonlocal count
+            count += 1
+            if count >= frames:
+                stop.set()
+            return process_telemetry(data)
+
+        process.process_telemetry = wrapper
+
+    return stop
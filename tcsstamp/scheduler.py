@@ -0,0 +1,74 @@
+"""Schedule the output of housekeeping to STAMP independent of the arrival of TCS frames."""
+import math
+import time
+from typing import Optional
+
+
+class OutputScheduler:
+    """
+    Decide when the next batch of housekeeping shall be sent out.
+
+    In periodic mode, a batch is due at fixed absolute deadlines on the monotonic clock, i.e.
+    `rate` seconds apart. The deadlines do not drift because they are never derived from the
+    time the previous batch was actually sent. When the caller falls behind, the missed
+    deadlines are skipped instead of sending a burst of batches.
+
+    In on-change mode, a batch is due as soon as new housekeeping arrived, but never earlier
+    than `rate` seconds after the previous batch. A rate of zero always means on-change mode,
+    i.e. every frame is sent out immediately.
+
+    Args:
+        rate (float): the output rate in seconds, fractional rates are allowed.
+        align (bool): align the periodic deadlines to the wall-clock, e.g. with a rate of 10s,
+            batches are sent at HH:MM:00, HH:MM:10, etc.
+        on_change (bool): send out a batch as soon as new housekeeping arrived.
+    """
+
+    def __init__(self, rate: float, align: bool = False, on_change: bool = False):
+        if rate < 0:
+            raise ValueError(f"The output rate shall be positive, got {rate}.")
+
+        self.rate = rate
+        self.on_change = on_change or rate == 0
+        self.pending = False
+
+        now = time.monotonic()
+
+        if self.on_change:
+            self.deadline = now
+        elif align:
+            self.deadline = now + self.rate - time.time() % self.rate
+        else:
+            self.deadline = now + self.rate
+
+    def notify(self):
+        """Tell the scheduler that new housekeeping has arrived."""
+        self.pending = True
+
+    def timeout(self) -> Optional[float]:
+        """
+        Returns the number of seconds until the next batch is due, or None when the next batch
+        can only become due after new housekeeping has arrived.
+        """
+        if self.on_change and not self.pending:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def is_due(self) -> bool:
+        """Returns True when the next batch shall be sent out now."""
+        if self.on_change and not self.pending:
+            return False
+        return time.monotonic() >= self.deadline
+
+    def sent(self):
+        """Tell the scheduler that the batch has been sent out, this schedules the next batch."""
+        now = time.monotonic()
+        self.pending = False
+
+        if self.on_change:
+            self.deadline = now + self.rate
+            return
+
+        self.deadline += self.rate
+        if self.deadline <= now:
+            self.deadline += (math.floor((now - self.deadline) / self.rate) + 1) * self.rate